@@ -4,17 +4,436 @@ import os
 from datetime import datetime
 import sys
 import re
+import time
+import queue
+import codecs
+import threading
+import atexit
+import tempfile
+import hashlib
+import uuid
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 
+import bars_migrate
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+def write_file_atomically(path, data):
+    """Write text to a temp file next to path and rename it over, so a crash never truncates path"""
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def locked_file(path):
+    """Hold an exclusive cross-process lock on path for the duration of the block"""
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10s; keep waiting for the other process
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ResponseFilter:
+    """Single-pass cleaner for model replies that can be fed chunk by chunk as they stream in.
+
+    Rules are matched left to right over the raw text:
+      - a stop marker ends the reply; nothing from the marker on is kept
+      - the first restart marker drops everything before it
+      - text between code fences is dropped; an unclosed fence is kept as plain text
+      - a cut pattern (case-insensitive) drops the rest of the reply, but only outside
+        code blocks; a later first restart marker still starts the reply over. Unlike the
+        old regex cleaner, text on both sides of a dropped code block never joins up into
+        a cut pattern ("Ans```x```wer:" is kept as "Answer:")
+    Runs of blank lines collapse to one newline and the result is stripped.
+    Markers are found with forward-only searches over the text (or a lowercased copy for the
+    case-insensitive ones) and fences are split out in bulk, also when skipping cut patterns that
+    sit inside code blocks, so every character is scanned a bounded number of times.
+    """
+
+    def __init__(self, stop_markers=(), restart_markers=(), fence="```", cut_patterns=()):
+        rules = (("stop", stop_markers), ("restart", restart_markers), ("cut", cut_patterns))
+
+        # Per state (restart still armed or not, or after a cut, when only a restart can bring
+        # the reply back): the (kind, literal, case-insensitive) markers to look for, in priority
+        # order, plus alternations for the exact and the case-insensitive ones. Short streamed
+        # chunks are quicker to search with those than literal by literal.
+        self.states = {}
+        for state, kinds in ((True, {"stop", "restart", "cut"}), (False, {"stop", "cut"}), ("cut", {"stop", "restart"})):
+            keys = []
+            for kind, literals in rules:
+                if kind in kinds:
+                    keys += [(kind, literal.lower(), True) if kind == "cut" else (kind, literal, False)
+                             for literal in literals]
+            patterns = {}
+            for ignore_case in (False, True):
+                groups = []
+                for kind, _ in rules:
+                    literals = [key for k, key, folded in keys if k == kind and folded == ignore_case]
+                    if literals:
+                        groups.append(f"(?P<{kind}>{'|'.join(re.escape(key) for key in literals)})")
+                patterns[ignore_case] = re.compile("|".join(groups)) if groups else None
+            self.states[state] = (keys, patterns)
+
+        self.short_text = 4096
+        self.fence = fence
+        self.stop_markers = list(stop_markers)
+        self.restart_markers = list(restart_markers)
+        self.cut_keys = [literal.lower() for literal in cut_patterns]
+        longest = max([len(literal) for _, literals in rules for literal in literals] + [len(fence)])
+        self.holdback = longest - 1
+        self.blank_lines = re.compile(r'\n(?:[^\S\n]*\n)+')
+
+        self.carry = ""
+        self.in_block = False
+        self.block_parts = []
+        self.restart_armed = bool(restart_markers)
+        self.cut = False
+        self.stopped = False
+        self.output = []
+        self.pending_space = []
+
+    def feed(self, chunk):
+        """Process the next chunk of raw output; returns True once the reply has ended"""
+        if not self.stopped:
+            self.scan(self.carry + chunk, final=False)
+        return self.stopped
+
+    def finish(self):
+        """Flush what's left and return the cleaned reply"""
+        if not self.stopped:
+            self.scan(self.carry, final=True)
+        self.carry = ""
+        self.close_unfinished_block()
+        return "".join(self.output).strip()
+
+    def scan(self, text, final):
+        """Run the state machine over text, holding back a possible partial marker unless final"""
+        safe_end = len(text) if final else max(len(text) - self.holdback, 0)
+        pos = search_from = 0
+        haystacks = {False: text}
+        upcoming = {}
+
+        while True:
+            match = self.find_marker(haystacks, search_from, safe_end, upcoming)
+            if match is None:
+                pos = self.consume(text, pos, max(safe_end, pos), final)
+                break
+
+            start, end, kind = match
+            self.consume(text, pos, start, True)
+            if kind == "cut" and self.in_block:
+                # Cut patterns don't apply inside code blocks: jump to the first one outside them, or
+                # to the next stop/restart marker (or the end of what's safe to take) if that's sooner
+                bound = self.next_marker_start(text, start, safe_end)
+                cut_at = self.next_cut_outside_blocks(text, start, bound)
+                if cut_at >= 0:
+                    pos = search_from = self.consume(text, start, cut_at, True)
+                else:
+                    pos = search_from = self.consume(text, start, bound, final or bound < safe_end)
+                continue
+            pos = search_from = end
+
+            if kind == "restart":
+                self.restart_armed = False
+                self.cut = False
+                self.in_block = False
+                self.block_parts = []
+                self.output = []
+                self.pending_space = []
+            elif kind == "cut":
+                self.cut = True
+                # Nothing can bring the rest back once the restart marker has been used
+                if not self.restart_armed:
+                    self.stopped = True
+                    return
+            else:
+                # Stop marker: the model started writing the next turn
+                self.stopped = True
+                return
+
+        self.carry = text[pos:]
+
+    def find_marker(self, haystacks, search_from, safe_end, upcoming):
+        """Next (start, end, kind) marker that begins before safe_end, or None.
+
+        On long text, upcoming maps each literal to (next position or -1, start of the unsearched
+        rest), so every literal only ever searches forward, and no further than the best hit so far.
+        On short text it maps each alternation to its next match (or None), for the same reason.
+        """
+        keys, patterns = self.states["cut" if self.cut else self.restart_armed]
+
+        if len(haystacks[False]) - search_from <= self.short_text:
+            best = None
+            for ignore_case in (False, True):
+                pattern = patterns[ignore_case]
+                if pattern is None:
+                    continue
+                # A match (or no match up to the end) found earlier still holds if it's not behind us
+                if pattern in upcoming and (upcoming[pattern] is None or upcoming[pattern].start() >= search_from):
+                    match = upcoming[pattern]
+                else:
+                    match = pattern.search(self.haystack(haystacks, ignore_case), search_from)
+                    upcoming[pattern] = match
+                if match and match.start() < safe_end and (best is None or match.start() < best[0]):
+                    best = (match.start(), match.end(), match.lastgroup)
+            return best
+
+        # Search in growing windows so a marker near the front doesn't cost a full pass per literal
+        best_at, best = safe_end, None
+        window = max(self.short_text, 64)
+        while True:
+            limit = min(search_from + window, safe_end)
+            for kind, key, ignore_case in keys:
+                at, searched = upcoming.get((ignore_case, key), (-1, search_from))
+                if at < search_from:
+                    begin = max(search_from, searched)
+                    bound = min(best_at, limit)
+                    if begin < bound:
+                        at = self.haystack(haystacks, ignore_case).find(key, begin, bound + len(key) - 1)
+                    else:
+                        at = -1
+                    upcoming[(ignore_case, key)] = (at, at if at >= 0 else max(begin, bound))
+                if 0 <= at < best_at:
+                    best_at, best = at, (at, at + len(key), kind)
+            if best is not None or limit >= safe_end:
+                return best
+            window *= 4
+
+    def next_marker_start(self, text, start, safe_end):
+        """Where the next stop marker (or restart marker, while armed) begins, or safe_end"""
+        bound = safe_end
+        for marker in self.stop_markers + (self.restart_markers if self.restart_armed else []):
+            at = text.find(marker, start, bound + len(marker) - 1)
+            if at >= 0:
+                bound = at
+        return bound
+
+    def next_cut_outside_blocks(self, text, start, bound):
+        """First cut pattern outside code blocks that begins between start (inside a block) and bound, or -1.
+
+        The blocks are split out and the text between them searched in one go, so a reply with a
+        cut pattern in every block doesn't cost a search per block.
+        """
+        fence = self.fence
+        segment = text[start:min(len(text), bound + self.holdback)]
+        pieces = segment.split(fence)
+        # Join the plain pieces with a character that can't be part of a match, so they can't join up
+        separator = next(c for c in map(chr, range(0x110000))
+                         if c not in segment and not any(c in key for key in self.cut_keys))
+        folded = self.fold_case(separator.join(pieces[1::2]))
+        hits = [at for at in (folded.find(key) for key in self.cut_keys) if at >= 0]
+        if not hits:
+            return -1
+
+        at = min(hits)
+        piece = 2 * folded.count(separator, 0, at) + 1
+        offset = at - folded.rfind(separator, 0, at) - 1
+        at = start + sum(map(len, pieces[:piece])) + piece * len(fence) + offset
+        return at if at < bound else -1
+
+    @staticmethod
+    def fold_case(text):
+        """Lowercase text the way re's IGNORECASE matches it, keeping every character in place"""
+        if "İ" in text:
+            # The one character that lowercases to two; re's IGNORECASE treats it as a plain "i"
+            text = text.replace("İ", "i")
+        return text.lower()
+
+    def haystack(self, haystacks, ignore_case):
+        """The text to search: as is, or lowercased for case-insensitive markers (made on first use)"""
+        if ignore_case not in haystacks:
+            haystacks[True] = self.fold_case(haystacks[False])
+        return haystacks[ignore_case]
+
+    def consume(self, text, start, end, complete):
+        """Route text[start:end] to output or code blocks; returns how far it got.
+
+        Unless complete, a fence that may continue past end is left for the next chunk.
+        """
+        if self.cut:
+            return end
+        fence = self.fence
+        if not fence:
+            self.emit(text[start:end])
+            return end
+
+        segment_end = end if complete else min(len(text), end + len(fence) - 1)
+        pieces = text[start:segment_end].split(fence)
+        # Any fence found here starts before end; text after the last one may still grow into a fence
+        last_fence_end = segment_end - len(pieces[-1])
+        if len(pieces) > 1 and last_fence_end > end:
+            end = last_fence_end
+        pieces[-1] = pieces[-1][:max(end - last_fence_end, 0)] if len(pieces) > 1 else text[start:end]
+
+        # Pieces alternate between plain text and code blocks
+        opened = self.in_block
+        if len(pieces) > 1:
+            self.in_block = opened ^ ((len(pieces) - 1) % 2 == 1)
+        plain = pieces[1::2] if opened else pieces[0::2]
+        if not self.in_block:
+            self.block_parts = []
+        elif len(pieces) == 1:
+            self.block_parts.append(pieces[0])
+        else:
+            self.block_parts = [pieces[-1]]
+        self.emit("".join(plain))
+        return end
+
+    def close_unfinished_block(self):
+        """An unclosed code block isn't a code block: put it back as plain text"""
+        if not self.in_block:
+            return
+        block_text = "".join(self.block_parts)
+        self.in_block = False
+        self.block_parts = []
+        self.emit(self.fence)
+        self.scan(block_text, final=True)
+
+    def emit(self, text):
+        """Send plain text to the output with blank lines collapsed"""
+        if not text or self.cut:
+            return
+        if text.isspace():
+            # Hold whitespace back until we see what follows it
+            self.pending_space.append(text)
+            return
+        if self.pending_space:
+            text = "".join(self.pending_space) + text
+            self.pending_space = []
+
+        content = text.rstrip()
+        if len(content) < len(text):
+            self.pending_space.append(text[len(content):])
+        self.output.append(self.blank_lines.sub("\n", content))
+
+
+class ContextSection:
+    """A precomputed piece of the prompt; its version moves on every time the text changes"""
+
+    def __init__(self):
+        self.text = ""
+        self.version = 0
+
+    def set(self, text):
+        self.text = text
+        self.version += 1
+
+    def append(self, line):
+        self.set(f"{self.text}\n{line}" if self.text else line)
+
+
 class BarsAI:
-    def __init__(self, model_name="dolphin-mistral"):
-        self.model_name = model_name
-        self.main_directory = Path("D:/bars-c")
+    def __init__(self, model_name="dolphin-mistral", code_model=None, chat_model=None, main_directory="D:/bars-c"):
+        self.model_name = chat_model or model_name
+        self.main_directory = Path(main_directory)
         self.system_prompt_file = self.main_directory / "bars_system_prompt.txt"
         self.memory_file = self.main_directory / "bars_memory.json"
         self.projects_dir = self.main_directory / "projects"
         self.max_context_length = 4000
         self.timeout = 90 # seconds
+
+        # Model routing: project requests go to a code model, chit-chat to a small fast one
+        self.routes = {
+            "code": code_model or model_name,
+            "chat": chat_model or model_name
+        }
+        self.model_stats = {}      # model -> rolling latency / tokens-per-sec estimates
+        self.model_stats_file = self.main_directory / "bars_model_stats.json"
+        self.model_stats_dirty = False
+        self.model_stats_lock = threading.Lock() # replies update stats while the flush thread saves them
+        self.model_last_used = {}  # tagged model name -> wall clock time, for idle unloading
+        self.stats_smoothing = 0.3
+        self.model_memory_budget_gb = 8.0
+        self.model_retry_after = 300 # seconds
+
+        # Generation budgets: output tokens per intent, deadlines scaled from measured tokens/sec
+        self.token_budgets = {"chat": 200, "code": 3000}
+        self.deadline_limits = {"chat": self.timeout, "code": 300} # seconds
+        self.deadline_slack = 1.5
+        self.min_deadline = 10 # seconds
+
+        # Response cleaning rules, see ResponseFilter
+        self.response_rules = {
+            "stop_markers": ["Aditya:"],
+            "restart_markers": ["Bars:"],
+            "fence": "```",
+            # Common hallucination patterns
+            "cut_patterns": [
+                "OUTPUT:",
+                "Question:",
+                "Answer:",
+                "This is an example",
+                "The first step",
+                "Next, we need"
+            ]
+        }
+
+        # Rolling summarization: keep only the latest pairs raw, fold older ones into summaries
+        self.recent_pairs_window = 40
+        self.summary_batch_size = 20
+        self.max_summaries = 30
+        self.summary_max_chars = 800
+        self.max_model_summaries = 2 # per compaction run; a bigger backlog is summarized extractively
+        self.reply_in_progress = threading.Event()
+        self.memory_lock = threading.RLock()
+        self.compaction_thread = None
+
+        # Prompt sections are kept current as memory changes, so a turn never rebuilds them
+        self.recent_context_pairs = 5
+        self.recent_window = deque(maxlen=self.recent_context_pairs)
+        self.summary_lines = []
+        self.context_sections = {name: ContextSection() for name in ("facts", "snapshot", "recent", "summaries")}
+        self.prompt_heads = {}
+
+        # Write-behind persistence: changes queue journal entries, a background thread flushes
+        # them to a journal shared by every Bars process and polls it for their changes
+        self.journal_file = self.memory_file.with_suffix(".journal")
+        self.lock_file = self.memory_file.with_suffix(".lock")
+        self.import_hashes_file = self.main_directory / "bars_import_hashes.bin" # dedupe state for bars_migrate
+        self.import_hashes_lock = self.import_hashes_file.with_suffix(".lock")
+        self.journal_max_bytes = 256 * 1024
+        self.journal_generation = 0
+        self.journal_offset = 0
+        self.journal_stat = None
+        self.pending_ops = []
+        self.flush_interval = 2.0 # seconds
+        self.sync_interval = 5.0 # seconds
+        self.flush_lock = threading.Lock()
+        self.flush_requested = threading.Event()
+        self.flush_stopping = threading.Event()
         
         # Create necessary directories
         self.main_directory.mkdir(exist_ok=True)
@@ -22,6 +441,12 @@ class BarsAI:
 
         self.load_system_prompt()
         self.load_memory()
+        self.load_model_stats()
+
+        self.flush_thread = threading.Thread(target=self.flush_worker, daemon=True)
+        self.flush_thread.start()
+        atexit.register(self.shutdown)
+
         self.scan_system_files()
 
     
@@ -51,71 +476,307 @@ class BarsAI:
                     })
 
         if snapshot:
-            self.memory["system_snapshot"] = snapshot
+            self.record_memory_op({"op": "snapshot", "snapshot": snapshot})
             print(f"✅ System snapshot updated with {len(snapshot)} folders.")
         else:
             print("⚠️ No folders with files found in the projects directory.")
 
-        self.save_memory()
+    def locked_import_hashes(self):
+        """Cross-process lock for the import dedupe filter (not the memory lock: imports flush memory while holding it)"""
+        return locked_file(self.import_hashes_lock)
 
     def load_memory(self):
-        """Load conversation memory from JSON"""
+        """Load conversation memory from the JSON checkpoint plus the shared journal"""
+        with locked_file(self.lock_file):
+            fresh = not self.memory_file.exists() and not self.journal_file.exists()
+            self.reload_memory()
+
+        if fresh:
+            # Initialize with existing chat history if available
+            self.migrate_old_memory()
+
+    def reload_memory(self):
+        """Rebuild memory from the checkpoint and journal, then reapply our unsaved changes (file lock held)"""
+        memory = {"conversation_pairs": [], "important_facts": []}
+        generation = 0
+
         if self.memory_file.exists():
             try:
                 with open(self.memory_file, "r", encoding="utf-8") as f:
-                    self.memory = json.load(f)
+                    memory = json.load(f)
+                if "conversation_pairs" not in memory:
+                    # Role-based file written by bars_cli_upgd.py; the next checkpoint rewrites it as pairs
+                    with open(self.memory_file, "rb") as f:
+                        memory = bars_migrate.memory_from_records(bars_migrate.iter_json_memory(f))
+                generation = memory.pop("journal_generation", 0)
             except json.JSONDecodeError:
                 print("⚠️  Memory file corrupted, starting fresh")
-                self.memory = {"conversation_pairs": [], "important_facts": []}
-        else:
-            # Initialize with existing chat history if available
-            self.memory = {"conversation_pairs": [], "important_facts": []}
-            self.migrate_old_memory()
+
+        memory.setdefault("conversation_summaries", [])
+
+        # Older files have no ids; derive stable ones so every process agrees on them
+        for key in ("conversation_pairs", "conversation_summaries"):
+            for i, item in enumerate(memory[key]):
+                if "id" not in item:
+                    digest = hashlib.sha1(f"{key}:{i}:{json.dumps(item, sort_keys=True)}".encode("utf-8"))
+                    item["id"] = "legacy-" + digest.hexdigest()[:16]
+
+        self.journal_generation = generation
+        self.journal_offset = 0
+        ops = self.read_journal()
+        if ops is None:
+            # Journal belongs to an older checkpoint (crash mid-rotation); its entries are already in it
+            self.reset_journal(generation)
+            ops = []
+
+        with self.memory_lock:
+            self.memory = memory
+            for op in ops + self.pending_ops:
+                self.apply_memory_op(op)
+            self.refresh_context_sections()
     
     def migrate_old_memory(self):
         """Migrate from old text-based memory"""
         old_memory_file = self.main_directory / "bars_chat_history.txt"
         if old_memory_file.exists():
             try:
-                with open(old_memory_file, "r", encoding="utf-8") as f:
-                    old_content = f.read()
-                
-                # Parse old conversations and add to new format
-                lines = old_content.strip().split('\n')
-                current_pair = {}
-                
-                for line in lines:
-                    if line.startswith("Aditya:"):
-                        if current_pair.get("bars_response"):
-                            # Save previous complete pair
-                            self.memory["conversation_pairs"].append(current_pair)
-                        
-                        current_pair = {
-                            "user_input": line.replace("Aditya:", "").strip(),
-                            "bars_response": ""
-                        }
-                    elif line.startswith("Bars:") and current_pair.get("user_input"):
-                        current_pair["bars_response"] = line.replace("Bars:", "").strip()
-                
-                # Add the last pair if complete
-                if current_pair.get("user_input") and current_pair.get("bars_response"):
-                    self.memory["conversation_pairs"].append(current_pair)
-                
+                bars_migrate.import_history(self, [old_memory_file], quiet=True)
                 print("✅ Migrated old memory to new paired format")
-                self.save_memory()
             except Exception as e:
                 print(f"⚠️  Could not migrate old memory: {e}")
+
+    def add_conversation_pair(self, pair):
+        """Append a conversation pair to memory"""
+        pair.setdefault("id", uuid.uuid4().hex)
+        self.record_memory_op({"op": "pair", "pair": pair})
+
+    def record_memory_op(self, op):
+        """Apply a change to memory right away and queue it for the shared journal"""
+        with self.memory_lock:
+            self.apply_memory_op(op)
+            self.pending_ops.append(op)
+        self.save_memory()
+
+    def apply_memory_op(self, op):
+        """Apply one journal entry to memory; entries are safe to replay more than once"""
+        kind = op["op"]
+        pairs = self.memory["conversation_pairs"]
+        summaries = self.memory["conversation_summaries"]
+
+        if kind == "pair":
+            if not any(p.get("id") == op["pair"]["id"] for p in pairs):
+                pairs.append(op["pair"])
+                # Roll the recent window forward by one pair instead of re-formatting it
+                self.recent_window.append((op["pair"]["id"], self.format_pair(op["pair"])))
+                self.context_sections["recent"].set("\n".join(text for _, text in self.recent_window))
+        elif kind == "fact":
+            if op["fact"] not in self.memory["important_facts"]:
+                self.memory["important_facts"].append(op["fact"])
+                self.context_sections["facts"].append(op["fact"])
+        elif kind == "snapshot":
+            self.memory["system_snapshot"] = op["snapshot"]
+            self.refresh_snapshot_section()
+        elif kind == "clear":
+            pairs.clear()
+            summaries.clear()
+            self.refresh_recent_section()
+            self.refresh_summary_section()
+        elif kind == "compact":
+            # Another process may have compacted the same pairs already
+            ids = set(op["pair_ids"])
+            remaining = [p for p in pairs if p.get("id") not in ids]
+            if len(remaining) < len(pairs):
+                pairs[:] = remaining
+                summaries.append(op["summary"])
+                if any(pair_id in ids for pair_id, _ in self.recent_window):
+                    self.refresh_recent_section()
+                self.refresh_summary_section()
+        elif kind == "summary":
+            # Imported history: slot in after a given summary (or first), since it predates the rest
+            if not any(s.get("id") == op["summary"]["id"] for s in summaries):
+                after = [i for i, s in enumerate(summaries) if s.get("id") == op.get("after")]
+                summaries.insert(after[0] + 1 if after else 0, op["summary"])
+                self.refresh_summary_section()
+        elif kind == "merge_summaries":
+            ids = set(op["summary_ids"])
+            positions = [i for i, s in enumerate(summaries) if s.get("id") in ids]
+            if positions:
+                kept = [s for s in summaries if s.get("id") not in ids]
+                kept.insert(positions[0], op["summary"])
+                summaries[:] = kept
+                self.refresh_summary_section()
+
+    def format_pair(self, pair):
+        return f"Aditya: {pair['user_input']}\nBars: {pair['bars_response']}"
+
+    def refresh_context_sections(self):
+        """Rebuild every prompt section from memory, after it was reloaded wholesale (memory lock held)"""
+        self.context_sections["facts"].set("\n".join(self.memory["important_facts"]))
+        self.refresh_snapshot_section()
+        self.refresh_recent_section()
+        self.refresh_summary_section()
+
+    def refresh_snapshot_section(self):
+        # System awareness:
+        if "system_snapshot" in self.memory and self.memory["system_snapshot"]:
+            snapshot_lines = []
+            for item in self.memory["system_snapshot"]:
+                files = ", ".join(item['files']) if item['files'] else "No files"
+                snapshot_lines.append(f"📁 Folder: {item['folder']} has files: {files}")
+            self.context_sections["snapshot"].set("\n\n📂 System Snapshot:\n" + "\n".join(snapshot_lines))
+        else:
+            self.context_sections["snapshot"].set("\n\n⚠️ Bars couldn't load your system snapshot.")
+
+    def refresh_recent_section(self):
+        self.recent_window.clear()
+        for pair in self.memory["conversation_pairs"][-self.recent_context_pairs:]:
+            self.recent_window.append((pair.get("id"), self.format_pair(pair)))
+        self.context_sections["recent"].set("\n".join(text for _, text in self.recent_window))
+
+    def refresh_summary_section(self):
+        # Summaries stay few (max_summaries), so re-formatting them all is cheap
+        self.summary_lines = [
+            f"[{summary.get('date', '')}] {summary['summary']}"
+            for summary in self.memory.get("conversation_summaries", [])
+        ]
+        self.context_sections["summaries"].set("\n".join(self.summary_lines))
     
     def save_memory(self):
-        """Save memory to JSON file"""
+        """Mark memory dirty; the flush thread writes it to disk shortly after"""
+        self.flush_requested.set()
+
+    def read_journal(self):
+        """Read journal entries past our offset, or None if the journal was rotated (file lock held)"""
+        ops = []
         try:
-            with open(self.memory_file, "w", encoding="utf-8") as f:
-                json.dump(self.memory, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"❌ Failed to save memory: {e}")
+            with open(self.journal_file, "rb") as f:
+                header = f.readline()
+                if not header.endswith(b"\n"):
+                    # Crashed while starting a journal; nothing in it can be trusted
+                    self.reset_journal(self.journal_generation)
+                    return ops
+                if json.loads(header).get("generation") != self.journal_generation:
+                    return None
+                if f.seek(0, os.SEEK_END) < self.journal_offset:
+                    return None
+
+                f.seek(max(self.journal_offset, len(header)))
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Torn write from a crashed process; pick it up if it ever completes
+                        break
+                    self.journal_offset = f.tell()
+                    try:
+                        ops.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+                self.journal_offset = max(self.journal_offset, len(header))
+        except FileNotFoundError:
+            self.reset_journal(self.journal_generation)
+
+        return ops
+
+    def reset_journal(self, generation):
+        """Start an empty journal for the given checkpoint generation (file lock held)"""
+        header = json.dumps({"generation": generation}).encode("utf-8") + b"\n"
+        with open(self.journal_file, "wb") as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_generation = generation
+        self.journal_offset = len(header)
+
+    def journal_changed(self):
+        """Cheap check for changes by other processes, without taking the lock"""
+        try:
+            st = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return True
+        return (st.st_size, st.st_mtime_ns) != self.journal_stat
+
+    def sync_memory(self):
+        """Pull in other processes' changes incrementally (file lock held)"""
+        ops = self.read_journal()
+        if ops is None:
+            self.reload_memory()
+            return
+
+        with self.memory_lock:
+            for op in ops:
+                self.apply_memory_op(op)
+
+    def flush_memory(self):
+        """Merge other processes' changes and append ours to the shared journal"""
+        with self.flush_lock:
+            with self.memory_lock:
+                if not self.pending_ops and not self.journal_changed():
+                    return
+
+            ops = []
+            try:
+                with locked_file(self.lock_file):
+                    self.sync_memory()
+
+                    with self.memory_lock:
+                        ops, self.pending_ops = self.pending_ops, []
+                    if ops:
+                        data = b"".join(
+                            json.dumps(op, ensure_ascii=False).encode("utf-8") + b"\n" for op in ops
+                        )
+                        with open(self.journal_file, "ab") as f:
+                            f.write(data)
+                            f.flush()
+                            os.fsync(f.fileno())
+                            self.journal_offset = f.tell()
+                        ops = []
+
+                    if not self.memory_file.exists() or self.journal_offset > self.journal_max_bytes:
+                        self.write_checkpoint()
+
+                    st = os.stat(self.journal_file)
+                    self.journal_stat = (st.st_size, st.st_mtime_ns)
+            except Exception as e:
+                with self.memory_lock:
+                    self.pending_ops = ops + self.pending_ops
+                print(f"❌ Failed to save memory: {e}")
+
+    def write_checkpoint(self):
+        """Fold the journal into the JSON file and start a new journal generation (file lock held)"""
+        with self.memory_lock:
+            if self.pending_ops:
+                # Checkpoint must match exactly what's journaled; try again next flush
+                return
+            generation = self.journal_generation + 1
+            # Serialize under the lock so we never write a half-updated memory
+            data = json.dumps(dict(self.memory, journal_generation=generation), indent=2, ensure_ascii=False)
+
+        write_file_atomically(self.memory_file, data)
+        self.reset_journal(generation)
+
+    def flush_worker(self):
+        """Background loop that coalesces changes and flushes them after a short debounce"""
+        while not self.flush_stopping.is_set():
+            if self.flush_requested.wait(self.sync_interval):
+                # Debounce: let more changes pile up, unless we're shutting down
+                self.flush_stopping.wait(self.flush_interval)
+                self.flush_requested.clear()
+            # Also runs on the poll interval to pick up other processes' changes
+            self.flush_memory()
+            self.save_model_stats()
+
+    def shutdown(self):
+        """Stop the flush thread and make sure pending memory hits the disk"""
+        atexit.unregister(self.shutdown)
+        self.flush_stopping.set()
+        self.flush_requested.set()
+        self.flush_memory()
+        self.save_model_stats()
     
     def get_recent_context(self, max_pairs=5):
         """Get recent conversation context from pairs"""
+        if max_pairs == self.recent_context_pairs:
+            return self.context_sections["recent"].text
+
         recent_pairs = self.memory["conversation_pairs"][-max_pairs:]
         context_lines = []
         
@@ -124,7 +785,153 @@ class BarsAI:
             context_lines.append(f"Bars: {pair['bars_response']}")
         
         return "\n".join(context_lines)
+
+    def get_summary_context(self, max_chars):
+        """Get older conversation summaries, newest first, within a character budget"""
+        if len(self.context_sections["summaries"].text) <= max_chars:
+            return self.context_sections["summaries"].text
+
+        summary_lines = []
+        used = 0
+
+        for line in reversed(self.summary_lines):
+            if used + len(line) > max_chars:
+                break
+            summary_lines.append(line)
+            used += len(line) + 1
+
+        # Oldest first reads more naturally in the prompt
+        return "\n".join(reversed(summary_lines))
+
+    def summarize_texts(self, texts):
+        """Summarize a batch of conversation lines with the local model, extractive fallback"""
+        prompt = (
+            "Summarize this conversation between Aditya and Bars in a few short sentences. "
+            "Keep names, decisions, projects and anything Aditya would expect Bars to remember. "
+            "Reply with the summary only.\n\n" + "\n".join(texts) + "\n\nSummary:"
+        )
+
+        try:
+            result = subprocess.run(
+                ["ollama", "run", self.model_name],
+                input=prompt,
+                capture_output=True,
+                encoding="utf-8",
+                errors="replace",
+                timeout=self.timeout
+            )
+            summary = result.stdout.strip() if result.returncode == 0 else ""
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            summary = ""
+
+        if not summary:
+            summary = self.extractive_summary(texts)
+
+        return summary[:self.summary_max_chars]
+
+    def extractive_summary(self, texts):
+        """Fallback summary: first sentence of every line, trimmed to the summary budget"""
+        per_line = max(40, self.summary_max_chars // max(len(texts), 1))
+        sentences = []
+
+        for text in texts:
+            first = re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+            if len(first) > per_line:
+                first = first[:per_line - 3].rstrip() + "..."
+            sentences.append(first)
+
+        return " | ".join(sentences)[:self.summary_max_chars]
+
+    def schedule_compaction(self):
+        """Start a background compaction if raw pairs have outgrown the recent window"""
+        with self.memory_lock:
+            overflow = len(self.memory["conversation_pairs"]) - self.recent_pairs_window
+            too_many_summaries = len(self.memory["conversation_summaries"]) > self.max_summaries
+            if overflow < self.summary_batch_size and not too_many_summaries:
+                return
+            if self.compaction_thread and self.compaction_thread.is_alive():
+                return
+
+            self.compaction_thread = threading.Thread(target=self.compact_memory, daemon=True)
+            self.compaction_thread.start()
+
+    def compact_memory(self):
+        """Fold the oldest raw pairs (and oldest summaries) into dated summary records"""
+        model_summaries = 0
+        compacted = []
+        try:
+            while True:
+                with self.memory_lock:
+                    pairs = self.memory["conversation_pairs"]
+                    if len(pairs) - self.recent_pairs_window < self.summary_batch_size:
+                        break
+                    batch = pairs[:self.summary_batch_size]
+
+                # Summarize outside the lock so replies are never blocked by the model
+                texts = []
+                for pair in batch:
+                    texts.append(f"Aditya: {pair['user_input']}")
+                    texts.append(f"Bars: {pair['bars_response']}")
+
+                # Keep the local model free for replies: only a few model summaries per run, never mid-reply
+                if model_summaries < self.max_model_summaries and not self.reply_in_progress.is_set():
+                    summary_text = self.summarize_texts(texts)
+                    model_summaries += 1
+                else:
+                    summary_text = self.extractive_summary(texts)
+                summary = {
+                    "date": datetime.now().strftime("%Y-%m-%d"),
+                    "first": batch[0].get("timestamp", ""),
+                    "last": batch[-1].get("timestamp", ""),
+                    "pair_count": len(batch),
+                    "summary": summary_text
+                }
+
+                batch_ids = [pair["id"] for pair in batch]
+                with self.memory_lock:
+                    head_ids = [pair["id"] for pair in self.memory["conversation_pairs"][:len(batch)]]
+                    # Memory may have been cleared (or compacted elsewhere) while we were summarizing
+                    if head_ids != batch_ids:
+                        return
+                    summary["id"] = uuid.uuid4().hex
+                    self.record_memory_op({"op": "compact", "pair_ids": batch_ids, "summary": summary})
+                compacted += batch
+
+            # Second tier: merge the oldest summaries so their count stays bounded too
+            with self.memory_lock:
+                summaries = list(self.memory["conversation_summaries"])
+                merge = self.merge_old_summaries()
+            merged = [s for s in summaries if merge and s.get("id") in merge["summary_ids"]]
+
+            # What leaves raw memory must still count as known if an old backup is imported again
+            if compacted or merged:
+                bars_migrate.remember_history(self, compacted, merged)
+        except Exception as e:
+            print(f"⚠️  Memory compaction failed: {e}")
     
+    def merge_old_summaries(self):
+        """Merge the oldest summaries into one once there are too many; returns the op, if any"""
+        with self.memory_lock:
+            summaries = self.memory["conversation_summaries"]
+            if len(summaries) <= self.max_summaries:
+                return None
+            merge_count = len(summaries) - self.max_summaries + 1
+            oldest = summaries[:merge_count]
+            op = {
+                "op": "merge_summaries",
+                "summary_ids": [s["id"] for s in oldest],
+                "summary": {
+                    "id": uuid.uuid4().hex,
+                    "date": oldest[-1].get("date", ""),
+                    "first": oldest[0].get("first", ""),
+                    "last": oldest[-1].get("last", ""),
+                    "pair_count": sum(s.get("pair_count", 0) for s in oldest),
+                    "summary": self.extractive_summary([s["summary"] for s in oldest])
+                }
+            }
+            self.record_memory_op(op)
+            return op
+
     def check_ollama_status(self):
         """Check if Ollama is running and model is available"""
         try:
@@ -139,9 +946,10 @@ class BarsAI:
             if result.returncode != 0:
                 return False, "Ollama is not running"
             
-            # Check if our model is available
-            if self.model_name not in result.stdout:
-                return False, f"Model {self.model_name} not found. Available models:\n{result.stdout}"
+            # Check if our models are available
+            for model in dict.fromkeys(self.routes.values()):
+                if model not in result.stdout:
+                    return False, f"Model {model} not found. Available models:\n{result.stdout}"
             
             return True, "All good!"
             
@@ -150,6 +958,326 @@ class BarsAI:
         except FileNotFoundError:
             return False, "Ollama is not installed"
         
+    def model_order(self, intent):
+        """Models to try for an intent: the routed one first, unless it's measured too slow to finish"""
+        preferred = self.routes[intent]
+        candidates = [preferred] + [m for m in dict.fromkeys(self.routes.values()) if m != preferred]
+
+        def timed_out_recently(model):
+            # Give a model that timed out another chance once it has rested a while
+            timed_out = self.model_stats.get(model, {}).get("timed_out", 0)
+            return time.time() - timed_out < self.model_retry_after
+
+        def fits(model):
+            expected = self.expected_duration(model, intent)
+            return not timed_out_recently(model) and (expected is None or expected < self.deadline_limits[intent])
+
+        fitting = [m for m in candidates if fits(m)]
+        slow = sorted(
+            (m for m in candidates if not fits(m)),
+            key=lambda m: (timed_out_recently(m), self.expected_duration(m, intent) or self.deadline_limits[intent])
+        )
+        return fitting + slow
+
+    def expected_duration(self, model, intent):
+        """Seconds a model should need to produce the intent's full token budget, or None if unmeasured"""
+        stats = self.model_stats.get(model)
+        if not stats:
+            return None
+        if stats.get("tokens_per_sec"):
+            return stats.get("first_token", 0) + self.token_budgets[intent] / stats["tokens_per_sec"]
+        return stats["latency"]
+
+    def first_token_deadline(self, model, intent, cold):
+        """Seconds to wait for the first token; a cold model also gets its measured load time"""
+        limit = self.deadline_limits[intent]
+        stats = self.model_stats.get(model)
+        if not stats or not stats.get("samples"):
+            return limit
+        expected = stats.get("first_token", 0)
+        if cold:
+            if not stats.get("load"):
+                # Never seen this model load, so no idea how long it takes
+                return limit
+            expected += stats["load"]
+        return min(max(expected * self.deadline_slack, self.min_deadline), limit)
+
+    def generation_deadline(self, model, intent):
+        """Seconds allowed after the first token, scaled from the model's measured throughput"""
+        limit = self.deadline_limits[intent]
+        tokens_per_sec = self.model_stats.get(model, {}).get("tokens_per_sec")
+        if not tokens_per_sec:
+            return limit
+        return min(max(self.token_budgets[intent] / tokens_per_sec * self.deadline_slack, self.min_deadline), limit)
+
+    def is_loaded(self, model):
+        """Whether ollama has the model in memory already (assume not if we can't tell)"""
+        try:
+            result = subprocess.run(["ollama", "ps"], capture_output=True, text=True, timeout=5)
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            return False
+        names = [line.split()[0] for line in result.stdout.splitlines()[1:] if line.strip()]
+        return self.tagged_name(model) in {self.tagged_name(name) for name in names}
+
+    def tagged_name(self, model):
+        """Model name as ollama lists it: 'dolphin-mistral' is really 'dolphin-mistral:latest'"""
+        return model if ":" in model else f"{model}:latest"
+
+    def run_model(self, model, prompt, intent):
+        """Stream one prompt through a model, cleaning as it goes; stops at the budget, deadline or end of reply"""
+        budget = self.token_budgets[intent]
+        # Ollama unloads idle models after a few minutes; a cold start must not count as slow
+        cold = not self.is_loaded(model)
+        first_token_deadline = self.first_token_deadline(model, intent, cold)
+        generation_deadline = self.generation_deadline(model, intent)
+        started = time.monotonic()
+        process = subprocess.Popen(
+            ["ollama", "run", model, "--verbose"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self.model_last_used[self.tagged_name(model)] = time.time()
+
+        # Pipes are read from threads so we can wait with a deadline on every platform
+        chunks = queue.Queue()
+        stderr_text = []
+
+        def pump_stdout():
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")  # Prevent crash on weird characters
+            for data in iter(lambda: process.stdout.read1(4096), b""):
+                chunks.put(decoder.decode(data))
+            chunks.put(decoder.decode(b"", final=True))
+            chunks.put(None)
+
+        def pump_stderr():
+            stderr_text.append(process.stderr.read().decode("utf-8", errors="replace"))
+
+        readers = [threading.Thread(target=pump_stdout, daemon=True), threading.Thread(target=pump_stderr, daemon=True)]
+        for reader in readers:
+            reader.start()
+
+        try:
+            process.stdin.write(prompt.encode("utf-8"))
+            process.stdin.close()
+        except OSError:
+            # ollama exited before reading the prompt; its stderr says why
+            pass
+
+        response_filter = ResponseFilter(**self.response_rules)
+        parts = []
+        tokens = 0.0
+        first_token = None
+        finished = False
+        reply_ended = False
+        while True:
+            # The throughput deadline only starts once the model is actually producing output
+            if first_token is None:
+                remaining = started + first_token_deadline - time.monotonic()
+            else:
+                remaining = started + first_token + generation_deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                chunk = chunks.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if chunk is None:
+                finished = True
+                break
+            if chunk and first_token is None:
+                first_token = time.monotonic() - started
+            parts.append(chunk)
+            tokens += self.estimate_tokens(chunk)
+            if response_filter.feed(chunk):
+                # The model moved on to writing Aditya's next line; nothing after it is wanted
+                reply_ended = True
+                break
+            if tokens >= budget:
+                break
+
+        elapsed = time.monotonic() - started
+        if finished:
+            process.wait()
+            for reader in readers:
+                reader.join(timeout=1)
+        else:
+            process.kill()
+            process.wait()
+        output = "".join(parts)
+        response = response_filter.finish()
+        error = stderr_text[0] if stderr_text else ""
+
+        if not finished and not reply_ended and not output.strip():
+            # Nothing at all before the deadline: let the router fall back to another model
+            if not cold:
+                self.record_model_timeout(model, elapsed)
+            raise subprocess.TimeoutExpired("ollama", first_token_deadline)
+
+        if not finished:
+            self.record_model_stats(model, elapsed, first_token, output, "")
+            if reply_ended:
+                return 0, response, error
+            # Hit the budget or deadline mid-reply: keep what we have, ending on a full sentence
+            return 0, self.trim_to_sentence(response), error
+
+        if process.returncode == 0 and first_token is not None:
+            self.record_model_stats(model, elapsed, first_token, output, error)
+        return process.returncode, response, error
+
+    def estimate_tokens(self, text):
+        """Rough token count: about 1.3 tokens per word"""
+        return len(text.split()) * 1.3
+
+    def trim_to_sentence(self, text):
+        """Cut a partial reply back to its last complete sentence, if that keeps most of it"""
+        if not text:
+            return text
+        ends = [m.end() for m in re.finditer(r'[.!?।](?=\s)|\n', text)]
+        if ends and ends[-1] > len(text) // 2:
+            return text[:ends[-1]].rstrip()
+        return text.rstrip() + "…"
+
+    def record_model_timeout(self, model, elapsed):
+        """Remember that a warm model produced nothing before its deadline, so the router backs off it"""
+        with self.model_stats_lock:
+            stats = self.model_stats.get(model)
+            if stats is not None:
+                stats["timed_out"] = time.time()
+            else:
+                self.model_stats[model] = {"latency": elapsed, "first_token": elapsed, "tokens_per_sec": 0.0,
+                                           "samples": 0, "timed_out": time.time()}
+            self.model_stats_dirty = True
+
+    def record_model_stats(self, model, elapsed, first_token, output, verbose_stats):
+        """Update rolling latency, time-to-first-token and tokens/sec estimates for a model"""
+        with self.model_stats_lock:
+            stats = self.model_stats.get(model)
+
+            durations = {}
+            for name in ("load duration", "total duration"):
+                match = re.search(rf'^{name}:\s*(\S+)', verbose_stats, re.MULTILINE)
+                if match:
+                    durations[name] = self.parse_duration(match.group(1))
+
+            # Cold loads are a one-off cost; the warm numbers are what routing and deadlines should use
+            load = durations.get("load duration", 0)
+            cold_load = load if load >= 1 else None
+            latency = max(durations.get("total duration", elapsed) - load, 0)
+            first_token = max(first_token - load, 0)
+
+            rate = re.search(r'^eval rate:\s*([\d.]+)', verbose_stats, re.MULTILINE)
+            if rate:
+                tokens_per_sec = float(rate.group(1))
+            elif elapsed > first_token + load:
+                tokens_per_sec = self.estimate_tokens(output) / (elapsed - first_token - load)
+            else:
+                tokens_per_sec = 0.0
+
+            self.model_stats_dirty = True
+            if stats is None or not stats.get("samples"):
+                self.model_stats[model] = {"latency": latency, "first_token": first_token,
+                                           "tokens_per_sec": tokens_per_sec, "samples": 1}
+                if cold_load:
+                    self.model_stats[model]["load"] = cold_load
+                return
+
+            weight = self.stats_smoothing
+            stats["latency"] = weight * latency + (1 - weight) * stats["latency"]
+            stats["first_token"] = weight * first_token + (1 - weight) * stats.get("first_token", first_token)
+            if tokens_per_sec:
+                stats["tokens_per_sec"] = weight * tokens_per_sec + (1 - weight) * stats["tokens_per_sec"]
+            if cold_load:
+                # Kept apart from the warm numbers: it only pads the first-token wait after an unload
+                stats["load"] = weight * cold_load + (1 - weight) * stats.get("load", cold_load)
+            stats["samples"] += 1
+            stats.pop("timed_out", None)
+
+    def load_model_stats(self):
+        """Load throughput estimates saved by earlier sessions"""
+        try:
+            with open(self.model_stats_file, "r", encoding="utf-8") as f:
+                self.model_stats = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.model_stats = {}
+
+    def save_model_stats(self):
+        """Persist throughput estimates if they changed"""
+        with self.model_stats_lock:
+            if not self.model_stats_dirty:
+                return
+            self.model_stats_dirty = False
+            data = json.dumps(self.model_stats, indent=2)
+        try:
+            write_file_atomically(self.model_stats_file, data)
+        except Exception as e:
+            self.model_stats_dirty = True
+            print(f"⚠️  Could not save model stats: {e}")
+
+    def parse_duration(self, text):
+        """Parse Go-style durations like '1m2.5s', '850.3ms' or '120µs' into seconds"""
+        units = {"h": 3600, "m": 60, "s": 1, "ms": 1e-3, "µs": 1e-6, "us": 1e-6, "ns": 1e-9}
+        return sum(float(value) * units[unit] for value, unit in re.findall(r'([\d.]+)(ms|µs|us|ns|h|m|s)', text))
+
+    def preload_model(self, model):
+        """Warm a model up in the background so the next turn doesn't pay the cold-load cost"""
+        def warm_up():
+            try:
+                # An empty prompt makes ollama load the model and return straight away
+                subprocess.run(
+                    ["ollama", "run", model],
+                    input="",
+                    capture_output=True,
+                    text=True,
+                    timeout=self.timeout
+                )
+                self.model_last_used[self.tagged_name(model)] = time.time()
+                self.enforce_model_budget(keep=model)
+            except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+                pass
+
+        threading.Thread(target=warm_up, daemon=True).start()
+
+    def loaded_models(self):
+        """Models ollama currently has in memory, with their size in GB"""
+        result = subprocess.run(["ollama", "ps"], capture_output=True, text=True, timeout=5)
+        loaded = {}
+        for line in result.stdout.splitlines()[1:]:
+            match = re.match(r'(\S+)\s+\S+\s+([\d.]+)\s*(GB|MB)', line)
+            if match:
+                size = float(match.group(2))
+                loaded[match.group(1)] = size if match.group(3) == "GB" else size / 1024
+        return loaded
+
+    def enforce_model_budget(self, keep=None):
+        """Unload least recently used models until loaded models fit the memory budget"""
+        try:
+            loaded = self.loaded_models()
+            total = sum(loaded.values())
+            # ollama ps lists tagged names; the user may have typed the bare one
+            idle_first = sorted(loaded, key=lambda m: self.model_last_used.get(self.tagged_name(m), 0))
+
+            for model in idle_first:
+                if total <= self.model_memory_budget_gb:
+                    break
+                if keep and self.tagged_name(model) == self.tagged_name(keep):
+                    continue
+                subprocess.run(["ollama", "stop", model], capture_output=True, text=True, timeout=10)
+                total -= loaded[model]
+        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            pass
+
+    def set_model(self, intent, model):
+        """Route an intent (or every intent, if None) to a model and start warming it up"""
+        if intent is None:
+            self.model_name = model
+            self.routes = {name: model for name in self.routes}
+        else:
+            self.routes[intent] = model
+            if intent == "chat":
+                self.model_name = model
+        self.preload_model(model)
+    
     def create_project_structure(self, project_name, files_dict):
         """Create project directory and files"""
         project_path = self.projects_dir / project_name
@@ -262,76 +1390,40 @@ class BarsAI:
         # Check if this is a project creation request
         is_project_request = self.parse_code_request(user_input)
 
-        recent_context = self.get_recent_context()
-
-        
-        important_facts = "\n".join(self.memory["important_facts"])
-
-        # System awareness:
-        if "system_snapshot" in self.memory and self.memory["system_snapshot"]:
-            snapshot_lines = []
-            for item in self.memory["system_snapshot"]:
-                files = ", ".join(item['files']) if item['files'] else "No files"
-                snapshot_lines.append(f"📁 Folder: {item['folder']} has files: {files}")
-            important_facts += "\n\n📂 System Snapshot:\n" + "\n".join(snapshot_lines)
-        else:
-            important_facts += "\n\n⚠️ Bars couldn't load your system snapshot."
-
-        
+        intent = "code" if is_project_request else "chat"
 
-        if is_project_request:
-            enhanced_prompt = f"""You are Bars, Aditya's coding buddy. He wants you to create a project. 
+        with self.memory_lock:
+            prompt_head, facts_length = self.get_prompt_head(intent)
+            recent_context = self.get_recent_context()
 
-Follow these rules:
-1. Create complete, working code
-2. Use proper filenames in comments like: # filename.py
-3. Write code in triple backticks with language specified
-4. Explain what each file does
-5. Be excited and encouraging like a true friend
-6. Respond in Hindi-English mix (Hinglish) as always
+            # Older summaries are lowest priority: they only get whatever budget is left
+            summary_budget = self.max_context_length - facts_length - len(recent_context)
+            older_context = self.get_summary_context(max(summary_budget, 0))
+        if older_context:
+            recent_context = f"(Earlier, summarized)\n{older_context}\n\n{recent_context}"
 
-{self.system_prompt}
-
-Important facts about our relationship:
-{important_facts}
-
-Recent conversation:
-{recent_context}
-
-Aditya: {user_input}
-Bars:"""
-        else:
-            enhanced_prompt = f"""You are Bars. Created by Aditya and trained by him using multiple unsencored LLMs. Respond ONLY as Bars would respond. Do not include any code, explanations, or meta-commentary unless specifically asked for coding help.
-
-{self.system_prompt}
-
-Important facts about our relationship:
-{important_facts}
-
-Recent conversation:
-{recent_context}
+        enhanced_prompt = f"""{prompt_head}{recent_context}
 
 Aditya: {user_input}
 Bars:"""
         
         try:
-            # Run ollama
-            process = subprocess.Popen(
-                ["ollama", "run", self.model_name],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                encoding="utf-8",    # Force proper decoding
-                errors="replace",    # Prevent crash on weird characters
-                text=True
-            )
-            
-            output, error = process.communicate(input=enhanced_prompt, timeout=self.timeout)
+            # Run ollama, falling back to the next model if the routed one times out
+            self.reply_in_progress.set()
+            try:
+                for model in self.model_order(intent):
+                    try:
+                        returncode, response, error = self.run_model(model, enhanced_prompt, intent)
+                        break
+                    except subprocess.TimeoutExpired:
+                        print(f"⏰ {model} took too long, trying another model...")
+                else:
+                    raise subprocess.TimeoutExpired("ollama", self.deadline_limits[intent])
+            finally:
+                self.reply_in_progress.clear()
             
-            if process.returncode != 0:
+            if returncode != 0:
                 return f"❌ Error from model: {error}"
-            
-            response = self.clean_response(output.strip())
 
             # If it's a project request, try to extract and create files
             if is_project_request:
@@ -354,12 +1446,11 @@ Bars:"""
             # Add conversation pair to memory
             conversation_pair = {
                 "user_input": user_input,
-                "bars_response": response
+                "bars_response": response,
+                "timestamp": datetime.now().isoformat()
             }
-            self.memory["conversation_pairs"].append(conversation_pair)
-            
-            # Save memory after each exchange
-            self.save_memory()
+            self.add_conversation_pair(conversation_pair)
+            self.schedule_compaction()
             
             return response
             
@@ -368,6 +1459,47 @@ Bars:"""
         except Exception as e:
             return f"❌ Unexpected error: {e}"
         
+    def get_prompt_head(self, intent):
+        """Everything in the prompt before the recent conversation, rebuilt only when facts or snapshot change"""
+        versions = (self.context_sections["facts"].version, self.context_sections["snapshot"].version)
+        cached = self.prompt_heads.get(intent)
+        if cached and cached[0] == versions:
+            return cached[1], cached[2]
+
+        important_facts = self.context_sections["facts"].text + self.context_sections["snapshot"].text
+
+        if intent == "code":
+            prompt_head = f"""You are Bars, Aditya's coding buddy. He wants you to create a project. 
+
+Follow these rules:
+1. Create complete, working code
+2. Use proper filenames in comments like: # filename.py
+3. Write code in triple backticks with language specified
+4. Explain what each file does
+5. Be excited and encouraging like a true friend
+6. Respond in Hindi-English mix (Hinglish) as always
+
+{self.system_prompt}
+
+Important facts about our relationship:
+{important_facts}
+
+Recent conversation:
+"""
+        else:
+            prompt_head = f"""You are Bars. Created by Aditya and trained by him using multiple unsencored LLMs. Respond ONLY as Bars would respond. Do not include any code, explanations, or meta-commentary unless specifically asked for coding help.
+
+{self.system_prompt}
+
+Important facts about our relationship:
+{important_facts}
+
+Recent conversation:
+"""
+
+        self.prompt_heads[intent] = (versions, prompt_head, len(important_facts))
+        return prompt_head, len(important_facts)
+
     def generate_project_name(self, user_input):
         """Generate project name from user input"""
         # Extract meaningful words and create a project name
@@ -384,38 +1516,17 @@ Bars:"""
     
     def clean_response(self, response):
         """Clean up model response to remove unwanted content"""
-
-        if "Aditya:" in response:
-            response = response.split("Aditya:")[0].strip()
-
-        if "Bars:" in response:
-            response = response.split("Bars:", 1)[-1].strip()
-
-
-        # Remove code blocks
-        response = re.sub(r'```.*?```', '', response, flags=re.DOTALL)
-        
-        # Remove common hallucination patterns
-        unwanted_patterns = [
-            r'OUTPUT:.*',
-            r'Question:.*',
-            r'Answer:.*',
-            r'This is an example.*',
-            r'The first step.*',
-            r'Next, we need.*'
-        ]
-        
-        for pattern in unwanted_patterns:
-            response = re.sub(pattern, '', response, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Clean up extra whitespace
-        response = re.sub(r'\n\s*\n', '\n', response)
-        return response.strip()
+        response_filter = ResponseFilter(**self.response_rules)
+        response_filter.feed(response)
+        return response_filter.finish()
     
     def add_important_fact(self, fact):
         """Add an important fact to long-term memory"""
-        self.memory["important_facts"].append(fact)
-        self.save_memory()
+        with self.memory_lock:
+            if fact in self.memory["important_facts"]:
+                print(f"💡 Already in long-term memory: {fact}")
+                return
+            self.record_memory_op({"op": "fact", "fact": fact})
         print(f"✅ Added to long-term memory: {fact}")
     
     def show_stats(self):
@@ -425,9 +1536,14 @@ Bars:"""
         projects = len(list(self.projects_dir.glob("*"))) if self.projects_dir.exists() else 0
         print(f"📊 bars Stats:")
         print(f"   Conversation pairs: {total_pairs}")
+        print(f"   Conversation summaries: {len(self.memory['conversation_summaries'])}")
         print(f"   Important facts: {important_facts}")
         print(f"   Projects: {projects}")
         print(f"   Current model: {self.model_name}")
+        for intent, model in self.routes.items():
+            stats = self.model_stats.get(model)
+            speed = f"{stats['latency']:.1f}s, {stats['tokens_per_sec']:.1f} tok/s" if stats else "not measured yet"
+            print(f"   {intent.capitalize()} model: {model} ({speed})")
         print(f"   Main directory: {self.main_directory}")
     
     def list_projects(self):
@@ -459,7 +1575,7 @@ Bars:"""
     def run(self):
         """Main chat loop"""
         print("🧠 Bars AI v2.1 - Enhanced with Project Creation!")
-        print(f"📱 Using model: {self.model_name}")
+        print(f"📱 Using model: {self.model_name} (code: {self.routes['code']})")
         print(f"📁 Main directory: {self.main_directory}")
         
         # Check ollama status
@@ -470,6 +1586,8 @@ Bars:"""
             return
         
         print("✅ Ollama is ready!")
+        for model in dict.fromkeys(self.routes.values()):
+            self.preload_model(model)
         print("💬 Type 'help' for commands, 'exit' to quit\n")
         
         while True:
@@ -489,7 +1607,7 @@ Bars:"""
                              Just say: "Create a calculator app" or "Make a simple game"
                              Bars will automatically create files and run them!
    remember - Add something to long-term memory
-   model    - Change AI model
+   model    - Change AI model (model name, or model code/chat name)
    clear    - Clear recent memory (keep important facts)
    run      - Run a project file (e.g., run project_name main.py)
    rescan   - Rescan the main directory for new projects
@@ -508,9 +1626,14 @@ Bars:"""
                     self.add_important_fact(fact)
                     continue
                 elif user_input.lower().startswith('model '):
-                    new_model = user_input[6:]  # Remove 'model '
-                    self.model_name = new_model
-                    print(f"🔄 Switched to model: {new_model}")
+                    new_model = user_input[6:].strip()  # Remove 'model '
+                    intent, _, name = new_model.partition(" ")
+                    if intent in self.routes and name:
+                        self.set_model(intent, name.strip())
+                        print(f"🔄 {intent.capitalize()} requests now go to: {name.strip()}")
+                    else:
+                        self.set_model(None, new_model)
+                        print(f"🔄 Switched to model: {new_model}")
                     continue
                 elif user_input.lower().startswith('run '):
                     # Parse run command: run project_name file_name args
@@ -525,8 +1648,8 @@ Bars:"""
                         print("❌ Usage: run project_name file_name [*args]")
                     continue
                 elif user_input.lower() == 'clear':
-                    self.memory["conversation_pairs"] = []
-                    self.save_memory()
+                    self.record_memory_op({"op": "clear"})
+                    bars_migrate.forget_history(self)
                     print("🗑️  Cleared recent conversations")
                     continue
                 elif user_input.lower() == 'rescan':
@@ -546,7 +1669,16 @@ Bars:"""
             except Exception as e:
                 print(f"❌ Error: {e}")
 
+        # Don't leave unsaved memory behind when the chat ends
+        self.shutdown()
+
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["migrate"]:
+        # python bars.py migrate old_history.txt ... / --export FILE
+        bars_migrate.main(sys.argv[2:], BarsAI)
+        sys.exit(0)
+
     # You can change the model here
     bars = BarsAI(model_name="dolphin-mistral")  # or "llama3.2:3b", "mistral:7b", etc.
+    # e.g. BarsAI(chat_model="llama3.2:3b", code_model="qwen2.5-coder:7b") to route by request type
     bars.run()
\ No newline at end of file
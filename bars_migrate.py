@@ -0,0 +1,550 @@
+import argparse
+import codecs
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+READ_SIZE = 1024 * 1024
+# Top-level arrays that hold one record per item; anything else (like system_snapshot) is one value
+RECORD_KEYS = ("conversation_pairs", "conversations", "important_facts", "conversation_summaries")
+# In a chat log, lines starting with this continue the message above, so no line of a message can pass for a new turn
+CONTINUATION = "  "
+
+
+class ProgressFile:
+    """Binary file wrapper that counts bytes read and reports progress now and then"""
+
+    def __init__(self, path, on_progress=None, every=2.0):
+        self.path = Path(path)
+        self.file = open(self.path, "rb")
+        self.total = os.path.getsize(self.path)
+        self.done = 0
+        self.on_progress = on_progress
+        self.every = every
+        self.last_report = time.monotonic()
+
+    def read(self, size=READ_SIZE):
+        data = self.file.read(size)
+        self.advance(len(data))
+        return data
+
+    def readline(self):
+        line = self.file.readline()
+        self.advance(len(line))
+        return line
+
+    def advance(self, count):
+        self.done += count
+        now = time.monotonic()
+        if self.on_progress and now - self.last_report >= self.every:
+            self.last_report = now
+            self.on_progress(self.done, self.total)
+
+    def close(self):
+        self.file.close()
+
+
+def iter_text_history(source):
+    """Yield conversation pairs from an 'Aditya: ... / Bars: ...' chat log, line by line"""
+    current_pair = {}
+    field = None
+
+    for raw_line in iter(source.readline, b""):
+        line = raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+        if line.startswith("Aditya:"):
+            if current_pair.get("bars_response"):
+                # Previous pair is complete
+                yield current_pair
+
+            current_pair = {
+                "user_input": line[len("Aditya:"):].strip(),
+                "bars_response": ""
+            }
+            field = "user_input"
+        elif line.startswith("Bars:") and current_pair.get("user_input"):
+            current_pair["bars_response"] = line[len("Bars:"):].strip()
+            field = "bars_response"
+        elif line.startswith(CONTINUATION) and field:
+            current_pair[field] += "\n" + line[len(CONTINUATION):]
+
+    # The last pair, if complete
+    if current_pair.get("user_input") and current_pair.get("bars_response"):
+        yield current_pair
+
+
+class JsonStream:
+    """Incremental reader for a top-level JSON object, decoding array items one at a time"""
+
+    def __init__(self, source):
+        self.source = source
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=READ_SIZE):
+        """Read more text into the buffer; returns False at end of file"""
+        if self.eof:
+            return False
+        if self.pos > len(self.buffer) // 2:
+            # Drop what we've already parsed so the buffer stays small
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        data = self.source.read(size)
+        if not data:
+            self.eof = True
+            self.buffer += self.text_decoder.decode(b"", final=True)
+            return False
+        self.buffer += self.text_decoder.decode(data)
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of the current buffer")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value, reading more as needed"""
+        self.peek()
+        size = READ_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the very end of the buffer might continue in the next read
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow reads geometrically so one huge value doesn't get re-parsed once per megabyte
+            self.fill(size)
+            size *= 2
+
+    def items(self, split_keys=()):
+        """Yield (key, value) for the top-level object; arrays under split_keys are yielded item by item"""
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            if key in split_keys and self.peek() == "[":
+                self.pos += 1
+                if self.peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.value()
+                        if self.peek() == ",":
+                            self.pos += 1
+                            continue
+                        self.expect("]")
+                        break
+            else:
+                yield key, self.value()
+
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+
+def iter_json_memory(source):
+    """Yield normalized records from either JSON memory format (bars.py or bars_cli_upgd.py)"""
+    pending_user = None
+
+    for key, value in JsonStream(source).items(RECORD_KEYS):
+        if key == "conversation_pairs":
+            yield "pair", value
+        elif key == "conversations":
+            # Role-based messages: a user message followed by the assistant's reply is one pair
+            if value.get("role") == "user":
+                pending_user = value
+            elif value.get("role") == "assistant" and pending_user is not None:
+                pair = {"user_input": pending_user.get("content", ""), "bars_response": value.get("content", "")}
+                if pending_user.get("timestamp"):
+                    pair["timestamp"] = pending_user["timestamp"]
+                yield "pair", pair
+                pending_user = None
+        elif key == "important_facts":
+            yield "fact", value
+        elif key == "conversation_summaries":
+            yield "summary", value
+        elif key == "system_snapshot":
+            yield "snapshot", value
+
+
+def memory_from_records(records):
+    """Build memory in bars.py's layout from normalized records, keeping every one of them"""
+    memory = {"conversation_pairs": [], "important_facts": [], "conversation_summaries": []}
+    for kind, value in records:
+        if kind == "pair":
+            memory["conversation_pairs"].append(value)
+        elif kind == "fact":
+            memory["important_facts"].append(value)
+        elif kind == "summary":
+            memory["conversation_summaries"].append(value)
+        elif kind == "snapshot":
+            memory["system_snapshot"] = value
+    return memory
+
+
+def detect_format(path):
+    """'json' or 'text', from the first non-blank character of the file"""
+    with open(path, "rb") as f:
+        head = f.read(4096).decode("utf-8", errors="replace").lstrip("﻿ \t\r\n")
+    return "json" if head.startswith("{") else "text"
+
+
+def iter_records(source, fmt):
+    """Yield (kind, value) records from any legacy Bars memory file"""
+    if fmt == "text":
+        for pair in iter_text_history(source):
+            yield "pair", pair
+    else:
+        yield from iter_json_memory(source)
+
+
+def pair_hash(pair):
+    """Content hash of a conversation pair, used to skip duplicates"""
+    text = f"{pair.get('user_input', '')}\x00{pair.get('bars_response', '')}"
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def summary_hash(summary):
+    """Content hash of a summary record; ids can't be trusted, older files have none"""
+    text = f"summary\x00{summary.get('summary', '')}"
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class SeenHashes:
+    """Bloom filter over content hashes, kept in a memory-mapped file so it survives between imports.
+
+    The file is a list of layers (a 16-byte header with the bit array's size and item count, then
+    the bits). New items go into the last layer, and once it's full a layer twice its size is
+    appended, so the file grows with the history actually seen. At 64 bits per item and 8 probes,
+    a false "duplicate" stays around one in 30 million.
+    """
+
+    header = struct.Struct("<QQ")
+    min_layer_bytes = 64 * 1024
+    bits_per_item = 64
+
+    def __init__(self, path, probes=8):
+        self.path = Path(path)
+        self.probes = probes
+        self.file = open(self.path, "r+b" if self.path.exists() else "w+b")
+        self.map = None
+        self.layers = []  # [offset of the bits, size in bytes, item count]
+        self.remap()
+
+    def remap(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        size = os.fstat(self.file.fileno()).st_size
+        if not size:
+            return
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.layers = []
+        offset = 0
+        while offset + self.header.size <= size:
+            layer_bytes, count = self.header.unpack_from(self.map, offset)
+            self.layers.append([offset + self.header.size, layer_bytes, count])
+            offset += self.header.size + layer_bytes
+
+    def expect(self, items):
+        """Size the first layer for about this many items; does nothing once the filter exists"""
+        if not self.layers:
+            self.add_layer(max(items * self.bits_per_item // 8, self.min_layer_bytes))
+
+    def add_layer(self, layer_bytes):
+        self.save_counts()
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        end = self.file.seek(0, os.SEEK_END)
+        self.file.write(self.header.pack(layer_bytes, 0))
+        # Extending with truncate leaves the new bits zero (and sparse where the filesystem can)
+        self.file.truncate(end + self.header.size + layer_bytes)
+        self.file.flush()
+        self.remap()
+
+    def add(self, digest):
+        """Remember digest; returns True if it was (probably) seen before"""
+        probes = [int.from_bytes(digest[i * 4:i * 4 + 4], "little") for i in range(self.probes)]
+        for offset, layer_bytes, _ in self.layers:
+            size = layer_bytes * 8
+            if all(self.map[offset + (p % size >> 3)] & (1 << (p % size & 7)) for p in probes):
+                return True
+
+        if not self.layers:
+            self.add_layer(self.min_layer_bytes)
+        elif self.layers[-1][2] >= self.layers[-1][1] * 8 // self.bits_per_item:
+            self.add_layer(2 * self.layers[-1][1])
+        layer = self.layers[-1]
+        offset, size = layer[0], layer[1] * 8
+        for p in probes:
+            self.map[offset + (p % size >> 3)] |= 1 << (p % size & 7)
+        layer[2] += 1
+        return False
+
+    def save_counts(self):
+        if self.map is None:
+            return
+        for offset, layer_bytes, count in self.layers:
+            self.header.pack_into(self.map, offset - self.header.size, layer_bytes, count)
+
+    def close(self):
+        self.save_counts()
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+@contextmanager
+def open_seen_hashes(bars):
+    """The shared dedupe filter, open under its cross-process lock"""
+    # Layer tables and counts are read-modify-write; two processes writing at once would corrupt them
+    with bars.locked_import_hashes():
+        seen = SeenHashes(bars.import_hashes_file)
+        try:
+            yield seen
+        finally:
+            seen.close()
+
+
+def remember_history(bars, pairs=(), summaries=()):
+    """Note pairs and summaries leaving the store (compacted or merged), so re-imports still skip them"""
+    with open_seen_hashes(bars) as seen:
+        for pair in pairs:
+            seen.add(pair_hash(pair))
+        for summary in summaries:
+            seen.add(summary_hash(summary))
+
+
+def forget_history(bars):
+    """Drop the import dedupe state, once the history it describes has been cleared"""
+    with bars.locked_import_hashes():
+        try:
+            bars.import_hashes_file.unlink()
+        except FileNotFoundError:
+            pass
+        except PermissionError as e:
+            # Windows won't delete a file something else still has open or mapped
+            print(f"⚠️  Could not reset import dedupe state ({e}); "
+                  f"delete {bars.import_hashes_file} before importing this history again")
+
+
+def format_size(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.1f} {unit}" if unit != "B" else f"{count} B"
+        count /= 1024
+
+
+def import_history(bars, paths, quiet=False):
+    """Stream legacy memory files into the Bars store, summarizing all but the most recent pairs.
+
+    Memory stays flat however big the files are: only the recent window of raw pairs, the
+    (bounded) summaries and the dedupe filter are ever held at once.
+    """
+    with open_seen_hashes(bars) as seen:
+        return import_into(bars, paths, seen, quiet)
+
+
+def import_into(bars, paths, seen, quiet):
+    """import_history with the dedupe filter already open"""
+    # Even the smallest record ("Aditya: x" / "Bars: y") takes about 20 bytes of any format
+    seen.expect(sum(os.path.getsize(path) for path in paths) // 20)
+    with bars.memory_lock:
+        for pair in bars.memory["conversation_pairs"]:
+            seen.add(pair_hash(pair))
+        for summary in bars.memory["conversation_summaries"]:
+            seen.add(summary_hash(summary))
+        keep_recent = not bars.memory["conversation_pairs"] and not bars.memory["conversation_summaries"]
+
+    # Imported history is older than anything already stored, so its summaries go first, in order
+    last_summary_id = None
+
+    stats = {"pairs": 0, "duplicates": 0, "facts": 0, "summaries": 0}
+    recent = deque()
+    batch_size = bars.summary_batch_size
+    window = bars.recent_pairs_window if keep_recent else 0
+
+    def add_summary(summary):
+        nonlocal last_summary_id
+        bars.record_memory_op({"op": "summary", "summary": summary, "after": last_summary_id})
+        last_summary_id = summary["id"]
+        stats["summaries"] += 1
+        merge = bars.merge_old_summaries()
+        if merge:
+            seen.add(summary_hash(merge["summary"]))
+            if last_summary_id in merge["summary_ids"]:
+                last_summary_id = merge["summary"]["id"]
+
+    def fold(batch):
+        texts = []
+        for pair in batch:
+            texts.append(f"Aditya: {pair['user_input']}")
+            texts.append(f"Bars: {pair['bars_response']}")
+        summary = {
+            "id": uuid.uuid4().hex,
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "first": batch[0].get("timestamp", ""),
+            "last": batch[-1].get("timestamp", ""),
+            "pair_count": len(batch),
+            "summary": bars.extractive_summary(texts)
+        }
+        seen.add(summary_hash(summary))
+        add_summary(summary)
+        # Write out regularly so pending changes never pile up in memory
+        if len(bars.pending_ops) >= 500:
+            bars.flush_memory()
+
+    for path in paths:
+        def report(done, total, name=Path(path).name):
+            percent = done * 100 // total if total else 100
+            print(f"📦 {name}: {percent}% ({format_size(done)} / {format_size(total)}), "
+                  f"{stats['pairs']:,} pairs, {stats['duplicates']:,} duplicates")
+
+        source = ProgressFile(path, None if quiet else report)
+        try:
+            for kind, value in iter_records(source, detect_format(path)):
+                if kind == "pair":
+                    if not value.get("user_input") and not value.get("bars_response"):
+                        continue
+                    if seen.add(pair_hash(value)):
+                        stats["duplicates"] += 1
+                        continue
+                    recent.append({k: value[k] for k in ("user_input", "bars_response", "timestamp") if k in value})
+                    stats["pairs"] += 1
+                    if len(recent) >= window + batch_size:
+                        fold([recent.popleft() for _ in range(batch_size)])
+                elif kind == "fact":
+                    with bars.memory_lock:
+                        known = value in bars.memory["important_facts"]
+                    if not known:
+                        bars.record_memory_op({"op": "fact", "fact": value})
+                        stats["facts"] += 1
+                elif kind == "summary":
+                    if not value.get("summary"):
+                        continue
+                    if seen.add(summary_hash(value)):
+                        stats["duplicates"] += 1
+                        continue
+                    add_summary(dict(value, id=value.get("id") or uuid.uuid4().hex))
+                elif kind == "snapshot":
+                    with bars.memory_lock:
+                        have_snapshot = bool(bars.memory.get("system_snapshot"))
+                    if isinstance(value, list) and not have_snapshot:
+                        bars.record_memory_op({"op": "snapshot", "snapshot": value})
+        finally:
+            source.close()
+        if not quiet:
+            report(source.total, source.total)
+
+    # What's left is the most recent history; leftovers beyond the window still get folded
+    while len(recent) > window:
+        fold([recent.popleft() for _ in range(min(batch_size, len(recent) - window))])
+    for pair in recent:
+        bars.add_conversation_pair(pair)
+    bars.flush_memory()
+
+    return stats
+
+
+def export_history(bars, path, fmt):
+    """Write the current store out in one of the legacy formats, one record at a time"""
+    with bars.memory_lock:
+        pairs = list(bars.memory["conversation_pairs"])
+        facts = list(bars.memory["important_facts"])
+        summaries = list(bars.memory["conversation_summaries"])
+
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "text":
+            def message(text):
+                return text.replace("\n", "\n" + CONTINUATION)
+            for pair in pairs:
+                f.write(f"Aditya: {message(pair['user_input'])}\n\nBars: {message(pair['bars_response'])}\n\n")
+            return
+
+        def write_array(key, items, last=False):
+            f.write(f'  "{key}": [')
+            for i, item in enumerate(items):
+                f.write(("," if i else "") + "\n    " + json.dumps(item, ensure_ascii=False))
+            f.write("\n  ]" if items else "]")
+            f.write("\n" if last else ",\n")
+
+        f.write("{\n")
+        if fmt == "roles":
+            def messages():
+                for pair in pairs:
+                    timestamp = pair.get("timestamp", "")
+                    yield {"role": "user", "content": pair["user_input"], "timestamp": timestamp}
+                    yield {"role": "assistant", "content": pair["bars_response"], "timestamp": timestamp}
+            write_array("conversations", list(messages()))
+            write_array("important_facts", facts, last=True)
+        else:
+            write_array("conversation_pairs", pairs)
+            write_array("conversation_summaries", summaries)
+            write_array("important_facts", facts, last=True)
+        f.write("}\n")
+
+
+def main(argv, bars_factory):
+    """`bars migrate`: import legacy memory files into the store, or export the store"""
+    parser = argparse.ArgumentParser(
+        prog="bars migrate",
+        description="Import old Bars memory files (chat log text, role-based JSON or paired JSON) "
+                    "into the current memory store, or export the store to one of those formats."
+    )
+    parser.add_argument("files", nargs="*", help="legacy memory files to import")
+    parser.add_argument("--export", metavar="FILE", help="write the current store to FILE instead")
+    parser.add_argument("--format", choices=["text", "roles", "pairs"], default="pairs",
+                        help="export format: text (chat log), roles (bars_cli_upgd.py) or pairs (bars.py)")
+    args = parser.parse_args(argv)
+
+    if not args.files and not args.export:
+        parser.error("give files to import, or --export FILE")
+
+    bars = bars_factory()
+    if args.export:
+        export_history(bars, args.export, args.format)
+        print(f"✅ Exported memory to {args.export} ({args.format} format)")
+        return
+
+    for path in args.files:
+        if not Path(path).is_file():
+            print(f"❌ {path} not found!")
+            sys.exit(1)
+
+    stats = import_history(bars, args.files)
+    bars.shutdown()
+    print(f"✅ Imported {stats['pairs']:,} pairs ({stats['duplicates']:,} duplicates skipped), "
+          f"{stats['facts']:,} facts, {stats['summaries']:,} summaries written")
@@ -0,0 +1,99 @@
+"""Benchmark ResponseFilter against the regex cleaner it replaced, on large adversarial replies.
+
+Run with: python bench_response_filter.py [size_in_mb]
+
+The chunked columns feed the reply the way run_model streams it: 4 KB is what it reads at most,
+64 B is closer to what a model actually trickles out. They pay per-chunk overhead the legacy
+cleaner never had, since that one could only run once the whole reply was in.
+"""
+import re
+import sys
+import time
+
+from bars import ResponseFilter
+
+
+RULES = {
+    "stop_markers": ["Aditya:"],
+    "restart_markers": ["Bars:"],
+    "fence": "```",
+    "cut_patterns": ["OUTPUT:", "Question:", "Answer:", "This is an example", "The first step", "Next, we need"]
+}
+
+
+def legacy_clean_response(response):
+    """clean_response as it was before ResponseFilter, kept here as the reference"""
+    if "Aditya:" in response:
+        response = response.split("Aditya:")[0].strip()
+
+    if "Bars:" in response:
+        response = response.split("Bars:", 1)[-1].strip()
+
+    response = re.sub(r'```.*?```', '', response, flags=re.DOTALL)
+
+    for pattern in [r'OUTPUT:.*', r'Question:.*', r'Answer:.*', r'This is an example.*', r'The first step.*', r'Next, we need.*']:
+        response = re.sub(pattern, '', response, flags=re.DOTALL | re.IGNORECASE)
+
+    response = re.sub(r'\n\s*\n', '\n', response)
+    return response.strip()
+
+
+def filter_response(response, chunk_size=None):
+    """Clean with ResponseFilter, either in one go or fed in chunks like a stream"""
+    response_filter = ResponseFilter(**RULES)
+    if chunk_size is None:
+        response_filter.feed(response)
+    else:
+        for i in range(0, len(response), chunk_size):
+            if response_filter.feed(response[i:i + chunk_size]):
+                break
+    return response_filter.finish()
+
+
+def adversarial_cases(size):
+    def repeat(unit, tail=""):
+        return unit * (size // len(unit)) + tail
+
+    return {
+        "prose": repeat("Arre bhai, sab badhiya hai. "),
+        "blank lines": repeat("\n \t"),
+        "near-miss markers": repeat("Adity Bar ``  Answe OUTPUT Questio "),
+        "many fences": repeat("```x```\n\n"),
+        "unclosed fence": "```" + repeat("a b\n"),
+        "late restart": repeat("Answer: ", "Bars: ok"),
+        "all backticks": repeat("`"),
+        "dotted capital I": repeat("İ", " QUESTİON: gone"),
+        "mixed case cut": repeat("qUeStIoN ", "QUESTION: gone"),
+        "cuts, unclosed fence": "```" + repeat("Answer: "),
+        "cuts, closed fence": "```" + repeat("Answer: ", "```after"),
+        "cut in every block": repeat("x```Answer: Aditya ```\n"),
+    }
+
+
+def best_of(runs, fn):
+    """Fastest of several runs, in milliseconds, plus the result"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, min(timings) * 1000
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 2 * 1024 * 1024
+    print(f"{'case':20} {'legacy':>10} {'filter':>10} {'4KB chunks':>12} {'64B chunks':>12}")
+
+    for name, response in adversarial_cases(size).items():
+        expected, legacy_ms = best_of(7, lambda: legacy_clean_response(response))
+        whole, whole_ms = best_of(7, lambda: filter_response(response))
+        chunked, chunked_ms = best_of(3, lambda: filter_response(response, 4096))
+        streamed, streamed_ms = best_of(3, lambda: filter_response(response, 64))
+        if not expected == whole == chunked == streamed:
+            print(f"❌ {name}: ResponseFilter disagrees with the legacy cleaner")
+            sys.exit(1)
+        print(f"{name:20} {legacy_ms:8.1f}ms {whole_ms:8.1f}ms {chunked_ms:10.1f}ms {streamed_ms:10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
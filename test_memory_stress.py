@@ -0,0 +1,120 @@
+import contextlib
+import io
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import bars
+import bars_migrate
+
+
+WRITERS = 8
+PAIRS_PER_WRITER = 200
+FACT_EVERY = 10
+HASH_BATCHES = 30
+HASH_BATCH_SIZE = 100
+
+
+def open_bars(main_directory):
+    """BarsAI on a scratch directory, without the startup chatter"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return bars.BarsAI(model_name="stress-test", main_directory=main_directory)
+
+
+def writer(main_directory, n):
+    """One Bars process appending pairs and facts as fast as it can"""
+    bars_ai = open_bars(main_directory)
+    # Tiny journal so it gets rotated many times while everyone is writing
+    bars_ai.journal_max_bytes = 20000
+    bars_ai.flush_interval = 0.01
+    bars_ai.sync_interval = 0.05
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(PAIRS_PER_WRITER):
+            bars_ai.add_conversation_pair({"user_input": f"writer {n} message {i}", "bars_response": "ok"})
+            if i % FACT_EVERY == 0:
+                bars_ai.add_important_fact(f"writer {n} fact {i}")
+            time.sleep(random.random() * 0.003)
+    bars_ai.shutdown()
+
+
+def hash_writer(main_directory, n):
+    """One Bars process noting compacted pairs in the shared dedupe filter, batch after batch"""
+    bars_ai = open_bars(main_directory)
+    for batch in range(HASH_BATCHES):
+        bars_migrate.remember_history(bars_ai, [
+            {"user_input": f"writer {n} batch {batch} message {i}", "bars_response": "ok"}
+            for i in range(HASH_BATCH_SIZE)
+        ])
+    bars_ai.shutdown()
+
+
+class MemoryStressTest(unittest.TestCase):
+    def setUp(self):
+        self.main_directory = tempfile.mkdtemp(prefix="bars-stress-")
+        shutil.copy(Path(__file__).with_name("bars_system_prompt.txt"), self.main_directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.main_directory, ignore_errors=True)
+
+    def test_concurrent_writers_lose_nothing(self):
+        processes = [
+            multiprocessing.Process(target=writer, args=(self.main_directory, n))
+            for n in range(WRITERS)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=300)
+            self.assertEqual(process.exitcode, 0)
+
+        bars_ai = open_bars(self.main_directory)
+        bars_ai.shutdown()
+        inputs = [pair["user_input"] for pair in bars_ai.memory["conversation_pairs"]]
+        expected = {f"writer {n} message {i}" for n in range(WRITERS) for i in range(PAIRS_PER_WRITER)}
+        self.assertEqual(len(inputs), len(expected))
+        self.assertEqual(set(inputs), expected)
+
+        facts = set(bars_ai.memory["important_facts"])
+        expected_facts = {
+            f"writer {n} fact {i}"
+            for n in range(WRITERS) for i in range(0, PAIRS_PER_WRITER, FACT_EVERY)
+        }
+        self.assertEqual(facts, expected_facts)
+
+        # The small journal must actually have been rotated for this to test anything
+        self.assertGreater(bars_ai.journal_generation, 0)
+
+    def test_concurrent_dedupe_writers_lose_nothing(self):
+        processes = [
+            multiprocessing.Process(target=hash_writer, args=(self.main_directory, n))
+            for n in range(WRITERS)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=300)
+            self.assertEqual(process.exitcode, 0)
+
+        bars_ai = open_bars(self.main_directory)
+        bars_ai.shutdown()
+        seen = bars_migrate.SeenHashes(bars_ai.import_hashes_file)
+        try:
+            # Enough items for several layers, so processes had to grow the file under each other
+            self.assertGreater(len(seen.layers), 1)
+            self.assertEqual(sum(count for _, _, count in seen.layers), WRITERS * HASH_BATCHES * HASH_BATCH_SIZE)
+            for n in range(WRITERS):
+                for batch in range(HASH_BATCHES):
+                    for i in range(HASH_BATCH_SIZE):
+                        pair = {"user_input": f"writer {n} batch {batch} message {i}", "bars_response": "ok"}
+                        self.assertTrue(seen.add(bars_migrate.pair_hash(pair)))
+        finally:
+            seen.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import bars
+import bars_migrate
+
+
+REPO = Path(__file__).parent
+
+
+class MigrateTest(unittest.TestCase):
+    def setUp(self):
+        self.main_directory = tempfile.mkdtemp(prefix="bars-migrate-")
+        shutil.copy(REPO / "bars_system_prompt.txt", self.main_directory)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.bars = bars.BarsAI(model_name="migrate-test", main_directory=self.main_directory)
+
+    def tearDown(self):
+        self.bars.shutdown()
+        shutil.rmtree(self.main_directory, ignore_errors=True)
+
+    def import_quietly(self, *paths):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return bars_migrate.import_history(self.bars, list(paths), quiet=True)
+
+    def test_import_repo_memory_file(self):
+        with open(REPO / "bars_memory.json", "r", encoding="utf-8") as f:
+            original = json.load(f)
+
+        stats = self.import_quietly(REPO / "bars_memory.json")
+
+        memory = self.bars.memory
+        self.assertEqual(stats["pairs"], len(original["conversation_pairs"]))
+        self.assertEqual(
+            [(p["user_input"], p["bars_response"]) for p in memory["conversation_pairs"]],
+            [(p["user_input"], p["bars_response"]) for p in original["conversation_pairs"]]
+        )
+        self.assertEqual(memory["system_snapshot"], original["system_snapshot"])
+
+    def test_reimport_skips_everything(self):
+        self.import_quietly(REPO / "bars_memory.json", REPO / "bars_chat_history.txt")
+        pair_count = len(self.bars.memory["conversation_pairs"])
+
+        stats = self.import_quietly(REPO / "bars_memory.json", REPO / "bars_chat_history.txt")
+
+        self.assertEqual(stats["pairs"], 0)
+        self.assertEqual(len(self.bars.memory["conversation_pairs"]), pair_count)
+
+    def test_export_round_trip(self):
+        self.import_quietly(REPO / "bars_memory.json")
+        expected = [(p["user_input"], p["bars_response"]) for p in self.bars.memory["conversation_pairs"]]
+
+        for fmt in ("pairs", "roles"):
+            exported = Path(self.main_directory) / f"export_{fmt}.json"
+            bars_migrate.export_history(self.bars, exported, fmt)
+            with open(exported, "rb") as f:
+                pairs = [value for kind, value in bars_migrate.iter_json_memory(f) if kind == "pair"]
+            self.assertEqual([(p["user_input"], p["bars_response"]) for p in pairs], expected)
+
+    def test_text_export_keeps_multiline_messages(self):
+        pairs = [
+            ("code dikha", "Ye le:\n\nprint('hi')\nAditya: ye line bhi reply ka hissa hai"),
+            ("line one\nline two", "Bars: naam se shuru"),
+        ]
+        for user_input, bars_response in pairs:
+            self.bars.add_conversation_pair({"user_input": user_input, "bars_response": bars_response})
+
+        exported = Path(self.main_directory) / "export.txt"
+        bars_migrate.export_history(self.bars, exported, "text")
+        with open(exported, "rb") as f:
+            imported = list(bars_migrate.iter_text_history(f))
+        self.assertEqual([(p["user_input"], p["bars_response"]) for p in imported], pairs)
+
+    def test_reimport_after_compaction(self):
+        # Pairs that only ever came from chat, backed up before they get compacted away
+        for i in range(60):
+            self.bars.add_conversation_pair({"user_input": f"chat message {i}", "bars_response": "ok"})
+        backup = Path(self.main_directory) / "backup.json"
+        bars_migrate.export_history(self.bars, backup, "pairs")
+
+        self.bars.max_model_summaries = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.bars.compact_memory()
+        self.assertEqual(len(self.bars.memory["conversation_pairs"]), self.bars.recent_pairs_window)
+
+        stats = self.import_quietly(backup)
+
+        self.assertEqual(stats["pairs"], 0)
+        self.assertEqual(stats["summaries"], 0)
+
+    def test_summaries_without_ids_import_once(self):
+        legacy = Path(self.main_directory) / "legacy.json"
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({"conversation_summaries": [{"date": "2024-01-01", "summary": "Talked about SQL homework"}]}, f)
+
+        self.assertEqual(self.import_quietly(legacy)["summaries"], 1)
+        self.assertEqual(self.import_quietly(legacy)["summaries"], 0)
+        self.assertEqual(len(self.bars.memory["conversation_summaries"]), 1)
+
+    def test_loads_role_based_memory_file(self):
+        main_directory = Path(tempfile.mkdtemp(prefix="bars-roles-"))
+        try:
+            shutil.copy(REPO / "bars_system_prompt.txt", main_directory)
+            with open(main_directory / "bars_memory.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "conversations": [
+                        {"role": "user", "content": "kya haal hai", "timestamp": "2024-01-01T10:00:00"},
+                        {"role": "assistant", "content": "Sab badhiya!\nAur tum?"}
+                    ],
+                    "important_facts": ["Aditya studies CS"]
+                }, f)
+            with contextlib.redirect_stdout(io.StringIO()):
+                bars_ai = bars.BarsAI(model_name="migrate-test", main_directory=main_directory)
+            bars_ai.shutdown()
+
+            self.assertEqual(
+                [(p["user_input"], p["bars_response"]) for p in bars_ai.memory["conversation_pairs"]],
+                [("kya haal hai", "Sab badhiya!\nAur tum?")]
+            )
+            self.assertEqual(bars_ai.memory["important_facts"], ["Aditya studies CS"])
+        finally:
+            shutil.rmtree(main_directory, ignore_errors=True)
+
+    def test_startup_migration_keeps_filter_small(self):
+        main_directory = Path(tempfile.mkdtemp(prefix="bars-startup-"))
+        try:
+            shutil.copy(REPO / "bars_system_prompt.txt", main_directory)
+            shutil.copy(REPO / "bars_chat_history.txt", main_directory)
+            with contextlib.redirect_stdout(io.StringIO()):
+                bars_ai = bars.BarsAI(model_name="migrate-test", main_directory=main_directory)
+            bars_ai.shutdown()
+
+            self.assertTrue(bars_ai.memory["conversation_pairs"])
+            self.assertLessEqual(bars_ai.import_hashes_file.stat().st_size, 128 * 1024)
+        finally:
+            shutil.rmtree(main_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()